@@ -26,16 +26,18 @@ import sys
 import time
 import os
 import configparser
-from subprocess import call, Popen, PIPE
+from subprocess import call, Popen, PIPE, DEVNULL
 import shutil
 import glob
+import sysconfig
+import hashlib
+import json
+import stat
 from traceback import format_exc
+from concurrent.futures import ThreadPoolExecutor
 
-from mininet.topo import Topo
-from mininet.net import Mininet
-from mininet.link import TCLink
-from mininet.node import Switch
-from mininet.util import ipStr, ipParse
+# Heavier Mininet modules are imported where used so that static helpers
+# such as cleanUp and verifyDependencies do not pull them in
 from mininet.log import info, debug, error
 
 
@@ -52,18 +54,33 @@ class Minindn(object):
     ndnSecurityDisabled = False
     workDir = '/tmp/minindn'
     resultDir = None
-
-    def __init__(self, parser=argparse.ArgumentParser(), topo=None, topoFile=None, noTopo=False, link=TCLink, **mininetParams):
+    # Default key of the ndn-cxx dummy keychain, as printed by ndnsec-get-default -k
+    _DUMMY_KEY_SIG = b'/dummy/KEY/-%9C%28r%B8%AA%3B%60'
+    # Bump when the cached topology format or its parsing changes
+    _TOPO_CACHE_VERSION = 1
+    # id(parent parser) -> (parent parser, Mini-NDN parser)
+    _parserCache = {}
+
+    def __init__(self, parser=argparse.ArgumentParser(), topo=None, topoFile=None, noTopo=False, link=None,
+                 args=None, **mininetParams):
         """Create MiniNDN object
         parser: Parent parser of Mini-NDN parser
         topo: Mininet topo object (optional)
         topoFile: Mininet topology file location (optional)
         noTopo: Allows specification of topology after network object is initialized (optional)
-        link: Allows specification of default Mininet link type for connections between nodes (optional)
+        link: Allows specification of default Mininet link type for connections between nodes (optional, TCLink by default)
+        args: Already parsed arguments, e.g. from parseKnownArgs; skips parsing sys.argv (optional).
+              A hand-built Namespace needs topoFile, workDir and resultDir, other options use their defaults
         mininetParams: Any params to pass to Mininet
         """
+        from mininet.net import Mininet
+        from mininet.link import TCLink
+
+        if link is None:
+            link = TCLink
+
         self.parser = Minindn.parseArgs(parser)
-        self.args = self.parser.parse_args()
+        self.args = self.parser.parse_args() if args is None else args
 
         Minindn.workDir = os.path.abspath(self.args.workDir)
         Minindn.resultDir = self.args.resultDir
@@ -77,8 +94,11 @@ class Minindn(object):
         if topo is None and not noTopo:
             try:
                 info('Generating topology frp, file {}\n'.format(self.topoFile))
-                self.topo = self.processTopo(self.topoFile)
-            except configparser.NoSectionError as e:
+                if getattr(self.args, 'noTopoCache', False):
+                    self.topo = self.processTopo(self.topoFile)
+                else:
+                    self.topo = self._loadCachedTopo(self.topoFile)
+            except (configparser.NoSectionError, OSError, UnicodeDecodeError) as e:
                 info('Error reading config file: {}\n'.format(e))
                 sys.exit(1)
         else:
@@ -96,19 +116,80 @@ class Minindn(object):
         if not self.net.switches:
             self.ethernetPairConnectivity()
 
+        Minindn.probeNdnSecurity()
+
+    @staticmethod
+    def _ndnCxxLibraries(ndnsec):
+        '''Return the libndn-cxx shared objects found in the directories searched by the
+           dynamic loader, without spawning a process'''
+        libDirs = [d for d in os.environ.get('LD_LIBRARY_PATH', '').split(os.pathsep) if d]
+        # Lib directory of the prefix ndn-cxx was installed to, e.g. /usr/local/lib
+        libDirs.append(os.path.join(os.path.dirname(os.path.dirname(ndnsec)), 'lib'))
+        multiarch = sysconfig.get_config_var('MULTIARCH')
+        for prefix in ['/usr/local/lib', '/usr/lib', '/lib']:
+            libDirs.append(prefix)
+            if multiarch:
+                libDirs.append(os.path.join(prefix, multiarch))
+
+        libraries = set()
+        for libDir in libDirs:
+            for library in glob.glob(os.path.join(libDir, 'libndn-cxx.so*')):
+                libraries.add(os.path.realpath(library))
+        return sorted(libraries)
+
+    @staticmethod
+    def probeNdnSecurity():
+        '''Detect the ndn-cxx dummy keychain patch, re-using the result of a previous run
+           while ndnsec-get-default and the libndn-cxx libraries are unchanged'''
+        ndnsec = shutil.which('ndnsec-get-default')
+        if ndnsec is None:
+            return
+
+        cacheFile = None
+        cacheKey = None
+        libraries = Minindn._ndnCxxLibraries(ndnsec)
+        cacheDir = Minindn._privateCacheDir()
+        # Without the library the patch lives in, a cached result cannot be validated
+        if libraries and cacheDir is not None:
+            cacheFile = '{}/ndnsec-probe.json'.format(cacheDir)
+            try:
+                cacheKey = [[path, os.stat(path).st_mtime_ns] for path in [ndnsec] + libraries]
+            except OSError:
+                cacheFile = None
+
+        if cacheFile is not None:
+            cached = Minindn._readCacheEntry(cacheFile)
+            if cached is not None and cached.get('key') == cacheKey:
+                Minindn.ndnSecurityDisabled = cached.get('disabled') is True
+                if Minindn.ndnSecurityDisabled:
+                    info('Dummy key chain patch is installed in ndn-cxx. Security will be disabled.\n')
+                return
+
         try:
-            process = Popen(['ndnsec-get-default', '-k'], stdout=PIPE, stderr=PIPE)
+            process = Popen([ndnsec, '-k'], stdout=PIPE, stderr=PIPE)
             output, error = process.communicate()
             if process.returncode == 0:
-                Minindn.ndnSecurityDisabled = '/dummy/KEY/-%9C%28r%B8%AA%3B%60' in output
-                info('Dummy key chain patch is installed in ndn-cxx. Security will be disabled.\n')
+                Minindn.ndnSecurityDisabled = Minindn._DUMMY_KEY_SIG in output
+                if Minindn.ndnSecurityDisabled:
+                    info('Dummy key chain patch is installed in ndn-cxx. Security will be disabled.\n')
             else:
                 debug(error)
+                return
         except:
-            pass
+            return
+
+        if cacheFile is not None:
+            Minindn._writeCacheEntry(cacheFile, {'key': cacheKey, 'disabled': Minindn.ndnSecurityDisabled})
 
     @staticmethod
     def parseArgs(parent):
+        '''Return the Mini-NDN parser extending parent, built once per parent parser.
+           Arguments added to parent after the first call are not picked up.'''
+        cached = Minindn._parserCache.get(id(parent))
+        # The parent is kept alive by the cache, so its id cannot be reused
+        if cached is not None and cached[0] is parent:
+            return cached[1]
+
         parser = argparse.ArgumentParser(prog='minindn', parents=[parent], add_help=False)
 
         # nargs='?' required here since optional argument
@@ -121,34 +202,156 @@ class Minindn(object):
         parser.add_argument('--result-dir', action='store', dest='resultDir', default=None,
                             help='Specify the full path destination folder where experiment results will be moved')
 
+        parser.add_argument('--no-topo-cache', action='store_true', dest='noTopoCache', default=False,
+                            help='Always parse the topology file instead of using the cached topology')
+
+        Minindn._parserCache[id(parent)] = (parent, parser)
         return parser
 
+    @staticmethod
+    def parseKnownArgs(parent=argparse.ArgumentParser(), argv=None):
+        '''Parse the Mini-NDN arguments, returning (args, remaining arguments).
+           The args can be passed on to the constructor.'''
+        return Minindn.parseArgs(parent).parse_known_args(argv)
+
     def ethernetPairConnectivity(self):
-        ndnNetBase = '10.0.0.0'
-        interfaces = []
+        from mininet.node import Switch
+        from mininet.util import ipStr, ipParse
+
+        ndnNetBase = ipParse('10.0.0.0')
+        interfaces = set()
+        links = set()
         for host in self.net.hosts:
             for intf in host.intfList():
                 link = intf.link
+                # Each link is reached once from each of its endpoints
+                if link in links:
+                    continue
+                links.add(link)
+
                 node1, node2 = link.intf1.node, link.intf2.node
 
                 if isinstance(node1, Switch) or isinstance(node2, Switch):
                     continue
 
                 if link.intf1 not in interfaces and link.intf2 not in interfaces:
-                    interfaces.append(link.intf1)
-                    interfaces.append(link.intf2)
-                    node1.setIP(ipStr(ipParse(ndnNetBase) + 1) + '/30', intf=link.intf1)
-                    node2.setIP(ipStr(ipParse(ndnNetBase) + 2) + '/30', intf=link.intf2)
-                    ndnNetBase = ipStr(ipParse(ndnNetBase) + 4)
+                    interfaces.add(link.intf1)
+                    interfaces.add(link.intf2)
+                    node1.setIP(ipStr(ndnNetBase + 1) + '/30', intf=link.intf1)
+                    node2.setIP(ipStr(ndnNetBase + 2) + '/30', intf=link.intf2)
+                    ndnNetBase += 4
+
+    @staticmethod
+    def _isPrivate(st):
+        '''Whether st belongs to the current user and is not writable by group or others'''
+        return st.st_uid == os.geteuid() and not st.st_mode & (stat.S_IWGRP | stat.S_IWOTH)
+
+    @staticmethod
+    def _privateCacheDir():
+        '''Return the cache directory under the work directory, creating it if needed.
+           None is returned if it is not a directory private to the current user, as the
+           work directory (/tmp/minindn by default) may be writable by others.'''
+        cacheDir = '{}/.cache'.format(Minindn.workDir)
+        try:
+            os.makedirs(cacheDir, mode=0o700, exist_ok=True)
+            st = os.lstat(cacheDir)
+        except OSError as e:
+            debug('Cannot use cache directory {}: {}\n'.format(cacheDir, e))
+            return None
+
+        if not stat.S_ISDIR(st.st_mode) or not Minindn._isPrivate(st):
+            debug('Ignoring cache directory {}: not private to the current user\n'.format(cacheDir))
+            return None
+        return cacheDir
+
+    @staticmethod
+    def _readCacheEntry(cacheFile):
+        '''Return the JSON content of cacheFile, or None if it is missing, unreadable or
+           not private to the current user'''
+        try:
+            with open(cacheFile) as f:
+                if not Minindn._isPrivate(os.fstat(f.fileno())):
+                    debug('Ignoring cache entry {}: not private to the current user\n'.format(cacheFile))
+                    return None
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _writeCacheEntry(cacheFile, content):
+        # Created 0600 regardless of umask, as _readCacheEntry rejects entries others can write.
+        # Written under a temporary name so a concurrent reader never sees a partial entry.
+        tmpFile = '{}.{}.tmp'.format(cacheFile, os.getpid())
+        try:
+            fd = os.open(tmpFile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
+                json.dump(content, f)
+            os.replace(tmpFile, cacheFile)
+        except OSError as e:
+            debug('Could not write cache entry {}: {}\n'.format(cacheFile, e))
+            try:
+                os.unlink(tmpFile)
+            except OSError:
+                pass
+
+    def _loadCachedTopo(self, topoFile):
+        '''Return the Topo for topoFile, re-using the topology parsed by a previous run if
+           the file content and modification time are unchanged'''
+        if type(self).processTopo is not Minindn.processTopo:
+            # A subclass parses topology files its own way, which the cache knows nothing about
+            return self.processTopo(topoFile)
+
+        # Read once, the same buffer is hashed and parsed on a cache miss
+        with open(topoFile, 'rb') as f:
+            data = f.read()
+            mtime = os.fstat(f.fileno()).st_mtime_ns
+
+        cacheDir = Minindn._privateCacheDir()
+        if cacheDir is None:
+            return Minindn._buildTopo(Minindn._parseTopo(topoFile, data))
+
+        # The format version is part of the key so entries of older releases are not re-used
+        cacheFile = '{}/topo-v{}-{}.json'.format(cacheDir, Minindn._TOPO_CACHE_VERSION,
+                                                 hashlib.sha1(data).hexdigest())
+        cached = Minindn._readCacheEntry(cacheFile)
+        if cached is not None and cached.get('mtime') == mtime:
+            debug('Using cached topology {}\n'.format(cacheFile))
+            return Minindn._buildTopo(cached['topo'])
+
+        topoData = Minindn._parseTopo(topoFile, data)
+        Minindn._writeCacheEntry(cacheFile, {'mtime': mtime, 'topo': topoData})
+        return Minindn._buildTopo(topoData)
 
     @staticmethod
     def processTopo(topoFile):
-        config = configparser.ConfigParser(delimiters=' ', allow_no_value=True)
-        config.read(topoFile)
+        with open(topoFile, 'rb') as f:
+            data = f.read()
+        return Minindn._buildTopo(Minindn._parseTopo(topoFile, data))
+
+    @staticmethod
+    def _buildTopo(topoData):
+        '''Create a Topo from the plain data returned by _parseTopo'''
+        from mininet.topo import Topo
+
         topo = Topo()
+        for name, params in topoData['hosts']:
+            topo.addHost(name, params=params)
+        for name in topoData['switches']:
+            topo.addSwitch(name)
+        for node1, node2, params in topoData['links']:
+            topo.addLink(node1, node2, **params)
+        return topo
+
+    @staticmethod
+    def _parseTopo(topoFile, data):
+        '''Parse the content of topoFile into hosts, switches and links made of plain
+           lists and dicts, so that the result can be cached as JSON'''
+        config = configparser.ConfigParser(delimiters=' ', allow_no_value=True)
+        config.read_string(data.decode(), source=topoFile)
+        topoData = {'hosts': [], 'switches': [], 'links': []}
 
         items = config.items('nodes')
-        coordinates = []
+        coordinates = set()
 
         for item in items:
             name = item[0].split(':')[0]
@@ -156,21 +359,23 @@ class Minindn(object):
                 error("FATAL: Duplicate Coordinate, \'{}\' used by multiple nodes\n" \
                      .format(item[1]))
                 sys.exit(1)
-            coordinates.append(item[1])
+            if item[1] != '_':
+                coordinates.add(item[1])
 
             params = {}
             for param in item[1].split(' '):
                 if param == '_':
                     continue
-                params[param.split('=')[0]] = param.split('=')[1]
+                key, _, value = param.partition('=')
+                params[key] = value
 
-            topo.addHost(name, params=params)
+            topoData['hosts'].append([name, params])
 
         try:
             items = config.items('switches')
             for item in items:
                 name = item[0].split(':')[0]
-                topo.addSwitch(name)
+                topoData['switches'].append(name)
         except configparser.NoSectionError:
             # Switches are optional
             pass
@@ -181,21 +386,66 @@ class Minindn(object):
 
             params = {}
             for param in item[1].split(' '):
-                key = param.split('=')[0]
-                value = param.split('=')[1]
+                key, _, value = param.partition('=')
                 if key in ['bw', 'jitter', 'max_queue_size']:
                     value = int(value)
                 if key == 'loss':
                     value = float(value)
                 params[key] = value
 
-            topo.addLink(link[0], link[1], **params)
+            topoData['links'].append([link[0], link[1], params])
 
-        return topo
+        return topoData
 
-    def start(self):
+    def start(self, timeout=3, pollInterval=0.05):
         self.net.start()
-        time.sleep(3)
+        self.waitReady(timeout, pollInterval)
+
+    def waitReady(self, timeout=3, pollInterval=0.05):
+        '''Wait until switches are connected and the links of all hosts have carrier,
+           at most timeout seconds'''
+        deadline = time.monotonic() + timeout
+        if self.net.switches and not self.net.waitConnected(timeout=timeout, delay=pollInterval):
+            debug('Switches not connected after {}s\n'.format(timeout))
+            return False
+
+        pending = {host: {intf.name for intf in host.intfList()} for host in self.net.hosts}
+        pending = {host: names for host, names in pending.items() if names}
+        if not pending:
+            return True
+
+        def probe(host):
+            # Probes queued behind the deadline are not started
+            if time.monotonic() >= deadline:
+                return set()
+            return Minindn._intfsWithCarrier(host)
+
+        # Each host has its own shell, so the probes can be issued concurrently
+        with ThreadPoolExecutor(max_workers=min(32, len(pending))) as executor:
+            while True:
+                hosts = list(pending)
+                for host, ready in zip(hosts, executor.map(probe, hosts)):
+                    pending[host] -= ready
+                    if not pending[host]:
+                        del pending[host]
+                if not pending:
+                    return True
+                if time.monotonic() >= deadline:
+                    debug('Host interfaces without carrier after {}s: {}\n'
+                          .format(timeout, sorted(name for names in pending.values() for name in names)))
+                    return False
+                time.sleep(pollInterval)
+
+    @staticmethod
+    def _intfsWithCarrier(node):
+        '''Names of the interfaces of node whose link is up, read with a single command'''
+        names = set()
+        for line in node.cmd('ip -o link show').splitlines():
+            # e.g. 2: a-eth0@if3: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 1500 ...
+            fields = line.split()
+            if len(fields) > 2 and 'LOWER_UP' in fields[2].strip('<>').split(','):
+                names.add(fields[1].rstrip(':').split('@')[0])
+        return names
 
     def stop(self):
         for cleanup in self.cleanups:
@@ -204,27 +454,42 @@ class Minindn(object):
 
         if Minindn.resultDir is not None:
             info("Moving results to \'{}\'\n".format(Minindn.resultDir))
-            os.system("mkdir -p {}".format(Minindn.resultDir))
-            for file in glob.glob('{}/*'.format(Minindn.workDir)):
-                shutil.move(file, Minindn.resultDir)
+            os.makedirs(Minindn.resultDir, exist_ok=True)
+            # Hidden entries (e.g. caches) stay in the work directory
+            entries = [entry for entry in os.scandir(Minindn.workDir) if not entry.name.startswith('.')]
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(Minindn._moveResult, entries))
+
+    @staticmethod
+    def _moveResult(entry):
+        destination = os.path.join(Minindn.resultDir, entry.name)
+        # os.replace would silently overwrite results of an earlier run
+        if os.path.lexists(destination):
+            raise shutil.Error("Destination path '{}' already exists".format(destination))
+        try:
+            os.replace(entry.path, destination)
+        except OSError:
+            # Cross-device move
+            shutil.move(entry.path, Minindn.resultDir)
 
     @staticmethod
     def cleanUp():
-        devnull = open(os.devnull, 'w')
-        call('nfd-stop', stdout=devnull, stderr=devnull)
-        call('mn --clean'.split(), stdout=devnull, stderr=devnull)
+        call('nfd-stop', stdout=DEVNULL, stderr=DEVNULL)
+        call('mn --clean'.split(), stdout=DEVNULL, stderr=DEVNULL)
 
     @staticmethod
     def verifyDependencies():
         """Prevent MiniNDN from running without necessary dependencies"""
         dependencies = ['nfd', 'nlsr', 'infoedit', 'ndnping', 'ndnpingserver']
-        devnull = open(os.devnull, 'w')
+        # Empty PATH entries mean the current directory
+        pathDirs = [d or os.curdir for d in os.environ.get('PATH', os.defpath).split(os.pathsep)]
         # Checks that each program is in the system path
         for program in dependencies:
-            if call(['which', program], stdout=devnull):
+            candidates = (os.path.join(d, program) for d in pathDirs)
+            # os.access alone would also accept a directory named like the program
+            if not any(os.path.isfile(c) and os.access(c, os.X_OK) for c in candidates):
                 error('{} is missing from the system path! Exiting...\n'.format(program))
                 sys.exit(1)
-        devnull.close()
 
     @staticmethod
     def sleep(seconds):
@@ -241,11 +506,20 @@ class Minindn(object):
 
     def initParams(self, nodes):
         '''Initialize Mini-NDN parameters for array of nodes'''
+        hostCmds = []
         for host in nodes:
             if 'params' not in host.params:
                 host.params['params'] = {}
             host.params['params']['workDir'] = Minindn.workDir
             homeDir = '{}/{}'.format(Minindn.workDir, host.name)
             host.params['params']['homeDir'] = homeDir
-            host.cmd('mkdir -p {}'.format(homeDir))
-            host.cmd('export HOME={} && cd ~'.format(homeDir))
\ No newline at end of file
+            # Home directories live in the shared root mount namespace
+            os.makedirs(homeDir, exist_ok=True)
+            hostCmds.append((host, 'export HOME={} && cd ~'.format(homeDir)))
+
+        if not hostCmds:
+            return
+
+        # Each host has its own shell, so the commands can be issued concurrently
+        with ThreadPoolExecutor(max_workers=min(32, len(hostCmds))) as executor:
+            list(executor.map(lambda hostCmd: hostCmd[0].cmd(hostCmd[1]), hostCmds))
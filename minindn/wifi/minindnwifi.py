@@ -43,17 +43,20 @@ from minindn.minindn import Minindn
 
 class MinindnWifi(Minindn):
     """ Class for handling default args, Mininet-wifi object and home directories """
-    def __init__(self, parser=argparse.ArgumentParser(), topo=None, topoFile=None, noTopo=False, link=WirelessLink, **mininetParams):
+    def __init__(self, parser=argparse.ArgumentParser(), topo=None, topoFile=None, noTopo=False, link=WirelessLink,
+                 args=None, **mininetParams):
         """Create Mini-NDN-Wifi object
         parser: Parent parser of Mini-NDN-Wifi parser (use to specify experiment arguments)
         topo: Mininet topo object (optional)
         topoFile: topology file location (optional)
         noTopo: Allows specification of topology after network object is initialized (optional)
         link: Allows specification of default Mininet/Mininet-Wifi link type for connections between nodes (optional)
+        args: Already parsed arguments; skips parsing sys.argv (optional).
+              A hand-built Namespace needs topoFile, workDir and resultDir, other options use their defaults
         mininetParams: Any params to pass to Mininet-WiFi
         """
         self.parser = self.parseArgs(parser)
-        self.args = self.parser.parse_args()
+        self.args = self.parser.parse_args() if args is None else args
 
         Minindn.workDir = self.args.workDir
         Minindn.resultDir = self.args.resultDir
@@ -75,25 +78,17 @@ class MinindnWifi(Minindn):
         else:
             self.topo = topo
 
+        ifb = getattr(self.args, 'ifb', False)
         if not noTopo:
-            self.net = Mininet_wifi(topo=self.topo, ifb=self.args.ifb, link=link, **mininetParams)
+            self.net = Mininet_wifi(topo=self.topo, ifb=ifb, link=link, **mininetParams)
         else:
-            self.net = Mininet_wifi(ifb=self.args.ifb, link=link, **mininetParams)
+            self.net = Mininet_wifi(ifb=ifb, link=link, **mininetParams)
 
         # Prevents crashes running mixed topos
         nodes = self.net.stations + self.net.hosts + self.net.cars
         self.initParams(nodes)
 
-        try:
-            process = Popen(['ndnsec-get-default', '-k'], stdout=PIPE, stderr=PIPE)
-            output, error = process.communicate()
-            if process.returncode == 0:
-                Minindn.ndnSecurityDisabled = '/dummy/KEY/-%9C%28r%B8%AA%3B%60' in output
-                info('Dummy key chain patch is installed in ndn-cxx. Security will be disabled.\n')
-            else:
-                debug(error)
-        except:
-            pass
+        Minindn.probeNdnSecurity()
 
         self.cleanups = []
 
@@ -137,8 +132,7 @@ class MinindnWifi(Minindn):
             for param in item[1].split(' '):
                     if param == "_":
                         continue
-                    key = param.split('=')[0]
-                    value = param.split('=')[1]
+                    key, _, value = param.partition('=')
                     if key in ['range']:
                         value = int(value)
                     params[key] = value
@@ -166,8 +160,7 @@ class MinindnWifi(Minindn):
                 for param in item[1].split(' '):
                     if param == "_":
                         continue
-                    key = param.split('=')[0]
-                    value = param.split('=')[1]
+                    key, _, value = param.partition('=')
                     if key in ['range']:
                         value = int(value)
                     ap_params[key] = value
@@ -185,8 +178,7 @@ class MinindnWifi(Minindn):
             for param in item[1].split(' '):
                 if param == "_":
                     continue
-                key = param.split('=')[0]
-                value = param.split('=')[1]
+                key, _, value = param.partition('=')
                 if key in ['bw', 'jitter', 'max_queue_size']:
                     value = int(value)
                 if key == 'loss':
@@ -197,6 +189,12 @@ class MinindnWifi(Minindn):
 
         return topo
 
+    def start(self):
+        self.net.start()
+        # Stations and APs live outside net.hosts/net.switches: give stations time to
+        # associate and APs time to reach their controller
+        time.sleep(3)
+
     def startMobility(self, max_x=1000, max_y=1000, **kwargs):
         """ Method to run a basic mobility setup on your net"""
         self.net.plotGraph(max_x=max_x, max_y=max_y)